@@ -1,21 +1,58 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.utils import secure_filename
+import os
+import glob
 import hashlib
 import time
 import re
-from collections import Counter
+import json
+import sqlite3
+import stat
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import Counter, OrderedDict
 from datetime import datetime, timedelta
 import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
+from nltk.tokenize import NLTKWordTokenizer, PunktTokenizer
 from nltk.corpus import stopwords
 import numpy as np
+from scipy.spatial.distance import cdist
+import orjson
 import gensim.downloader as api
-import faiss
+from gensim.models import KeyedVectors
 from flask_cors import CORS
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def dumps_json(obj):
+    """Serialize to JSON bytes with orjson, which walks NumPy arrays natively"""
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, so jsonify can emit NumPy arrays"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_json(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_json(obj), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 # Allow your frontend to make requests
 CORS(app, resources={
     r"/*": {
@@ -46,15 +83,112 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
-# Load pre-trained Word2Vec model (using smaller model for faster loading)
+# Stopwords and tokenizer models are fixed, so load them once instead of per request
+STOP_WORDS = frozenset(stopwords.words('english'))
+SENT_TOKENIZER = PunktTokenizer('english')
+WORD_TOKENIZER = NLTKWordTokenizer()  # The tokenizer behind nltk.word_tokenize
+
+# Pre-trained Word2Vec model (using smaller model for faster loading)
 # Options: 'word2vec-google-news-300', 'glove-wiki-gigaword-100', 'glove-twitter-25'
-# print("Loading Word2Vec model... (this may take a minute on first run)")
-# try:
-#     word2vec_model = api.load('glove-wiki-gigaword-100')  # 100-dim vectors, faster
-#     print("Word2Vec model loaded successfully!")
-# except Exception as e:
-#     print(f"Warning: Could not load Word2Vec model: {e}")
-word2vec_model = None
+WORD2VEC_MODEL_NAME = 'glove-wiki-gigaword-100'  # 100-dim vectors, faster
+# Native gensim copy of the model, memory-mapped so worker processes share its pages
+WORD2VEC_MMAP_PATH = os.path.join(api.BASE_DIR, WORD2VEC_MODEL_NAME, f'{WORD2VEC_MODEL_NAME}.kv')
+
+# The model is loaded lazily on first use so the server starts immediately.
+# A failed load is retried after a backoff that doubles up to an hour.
+_w2v = None
+_w2v_failures = 0
+_w2v_retry_at = 0
+_w2v_lock = threading.Lock()
+W2V_RETRY_SECONDS = 60
+W2V_MAX_RETRY_SECONDS = 3600
+
+def get_w2v():
+    """Return the Word2Vec model, loading it on first use. Returns None if it could not be loaded."""
+    global _w2v, _w2v_failures, _w2v_retry_at
+    if _w2v is None and time.time() >= _w2v_retry_at:
+        with _w2v_lock:
+            if _w2v is None and time.time() >= _w2v_retry_at:
+                _w2v = _load_w2v()
+                if _w2v is None:
+                    _w2v_retry_at = time.time() + min(W2V_RETRY_SECONDS * 2 ** _w2v_failures, W2V_MAX_RETRY_SECONDS)
+                    _w2v_failures += 1
+    return _w2v
+
+def _load_w2v():
+    """Load the Word2Vec model, converting it once to a memory-mappable file"""
+    print("Loading Word2Vec model... (this may take a minute on first run)")
+    try:
+        os.makedirs(os.path.dirname(WORD2VEC_MMAP_PATH), exist_ok=True)
+        # The reloader, the server and every pool worker may start at once;
+        # the file lock makes sure only one of them downloads and converts
+        with open(WORD2VEC_MMAP_PATH + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(WORD2VEC_MMAP_PATH):
+                _convert_w2v()
+        model = KeyedVectors.load(WORD2VEC_MMAP_PATH, mmap='r')
+        print("Word2Vec model loaded successfully!")
+        return model
+    except Exception as e:
+        print(f"Warning: Could not load Word2Vec model: {e}")
+        return None
+
+def _convert_w2v():
+    """Save the downloaded model in gensim's native format under a temporary name,
+    then move it into place, so readers never see a half-written file"""
+    model = api.load(WORD2VEC_MODEL_NAME)
+    tmp_path = f'{WORD2VEC_MMAP_PATH}.tmp{os.getpid()}'
+    model.save(tmp_path)
+    # Large arrays are saved beside the main file as <name>.<attribute>.npy.
+    # Move them first, as the main file's presence marks the conversion complete.
+    for array_path in glob.glob(glob.escape(tmp_path) + '.*.npy'):
+        os.replace(array_path, WORD2VEC_MMAP_PATH + array_path[len(tmp_path):])
+    os.replace(tmp_path, WORD2VEC_MMAP_PATH)
+
+# Warm the model in the background so the first embedding request doesn't wait on it
+threading.Thread(target=get_w2v, daemon=True).start()
+
+# Text processing is CPU-bound, so it runs in a pool of worker processes to keep
+# request threads free. Each worker re-imports this module and keeps its own
+# tokenization cache, so the default pool is small. Set PROCESS_WORKERS=0 to run inline.
+PROCESS_WORKERS = int(os.environ.get('PROCESS_WORKERS', min(2, os.cpu_count() or 1)))
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the worker process pool, starting it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawn rather than fork: this process already runs threads.
+                # Each worker loads Word2Vec once, sharing the memory-mapped vectors.
+                _pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=get_w2v)
+    return _pool
+
+def _discard_pool(broken):
+    """Shut down a broken pool so the next get_pool call starts a new one"""
+    global _pool
+    with _pool_lock:
+        # Another request thread may already have replaced it
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def run_in_pool(fn, *args, **kwargs):
+    """Run fn in the worker pool and wait for its result"""
+    if PROCESS_WORKERS == 0:
+        return fn(*args, **kwargs)
+    pool = get_pool()
+    try:
+        return pool.submit(fn, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for using too much memory); retry once on a new pool
+        _discard_pool(pool)
+        return get_pool().submit(fn, *args, **kwargs).result()
 
 # Rate limiting
 limiter = Limiter(
@@ -63,145 +197,469 @@ limiter = Limiter(
     default_limits=["100 per 15 minutes"]
 )
 
-# In-memory cache with TTL
-cache = {}
+# In-memory LRU cache with TTL, bounded by an approximate byte budget
+cache = OrderedDict()
+cache_bytes = 0
+cache_lock = threading.Lock()
 CACHE_TTL = 3600  # 1 hour in seconds
+MAX_CACHE_BYTES = 512 * 1024 * 1024  # 512MB
+
+# Results are also persisted to SQLite, so they survive restarts and are
+# shared between server processes. It is held to the same byte budget.
+# Cached results include the full text, so the database lives in a per-user
+# cache directory that only the server user can read.
+CACHE_DB_PATH = os.environ.get('CACHE_DB_PATH', os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'bookdebugger', 'cache.sqlite3'))
+_cache_db_conn = None
+_cache_db_unavailable = False
+_cache_db_lock = threading.Lock()
+
+# Maximum number of texts per batch request
+MAX_BATCH_SIZE = 50
 
 # Allowed file extensions
-ALLOWED_EXTENSIONS = {'txt', 'text', 'log', 'md', 'json', 'csv'}
+ALLOWED_EXTENSIONS = frozenset({'txt', 'text', 'log', 'md', 'json', 'csv'})
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, ext = os.path.splitext(filename)
+    if not ext and filename.startswith('.'):
+        # splitext counts leading dots as part of the name, so '.txt' has no extension
+        ext = '.' + filename.lstrip('.')
+    return ext[1:].lower() in ALLOWED_EXTENSIONS
+
+def text_digest(text):
+    """BLAKE2b digest of a text, which is considerably faster than SHA-256 on multi-megabyte texts"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def generate_cache_key(text, options=None, digest=None):
+    """Generate BLAKE2b hash for cache key, reusing the text's digest if it is already known"""
+    # Options are serialized with sorted keys so their order does not matter
+    key_hash = hashlib.blake2b((digest or text_digest(text)).encode('ascii'), digest_size=16)
+    key_hash.update(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+    return key_hash.hexdigest()
+
+def _cache_db():
+    """Return the connection to the persistent cache, or None if it is unavailable.
+    The connection is shared by all request threads, so hold _cache_db_lock while using it."""
+    global _cache_db_conn, _cache_db_unavailable
+    if _cache_db_conn is None and not _cache_db_unavailable:
+        try:
+            _check_cache_dir(os.path.dirname(CACHE_DB_PATH))
+            # Create the file private to this user; SQLite gives its WAL files the same mode
+            os.close(os.open(CACHE_DB_PATH, os.O_RDWR | os.O_CREAT, 0o600))
+            conn = sqlite3.connect(CACHE_DB_PATH, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS results '
+                             '(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, data BLOB NOT NULL)')
+                conn.execute('CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)')
+            _cache_db_conn = conn
+        except (OSError, sqlite3.Error) as e:
+            app.logger.warning(f'Persistent cache unavailable: {str(e)}')
+            _cache_db_unavailable = True  # Don't retry on every request
+    return _cache_db_conn
+
+def _check_cache_dir(path):
+    """Create the cache directory private to this user, refusing one that another user
+    could have pre-created or could write to"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+    if hasattr(os, 'getuid') and (st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)):
+        raise OSError(f'{path} must be owned by this user and not writable by others')
+
+def _remember(key, data, expires_at, size):
+    """Insert an entry into the in-memory LRU, evicting least recently used entries over budget"""
+    global cache_bytes
+    with cache_lock:
+        if key in cache:
+            cache_bytes -= cache.pop(key)['size']
+        
+        cache[key] = {
+            'data': data,
+            'expires_at': expires_at,
+            'size': size
+        }
+        cache_bytes += size
+        
+        # Always keep the newest entry, even if it alone exceeds the budget
+        while cache_bytes > MAX_CACHE_BYTES and len(cache) > 1:
+            _, evicted = cache.popitem(last=False)
+            cache_bytes -= evicted['size']
 
-def generate_cache_key(text, options=None):
-    """Generate SHA-256 hash for cache key"""
-    hash_input = text + str(options if options else {})
-    return hashlib.sha256(hash_input.encode('utf-8')).hexdigest()
+def get_cached_result(key):
+    """Return cached data for key, or None if missing or expired"""
+    global cache_bytes
+    with cache_lock:
+        entry = cache.get(key)
+        if entry is not None:
+            # Expiry is checked lazily, only when an entry is looked up
+            if time.time() < entry['expires_at']:
+                cache.move_to_end(key)
+                return entry['data']
+            del cache[key]
+            cache_bytes -= entry['size']
+    
+    # Fall back to the persistent cache, e.g. after a restart
+    with _cache_db_lock:
+        conn = _cache_db()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute('SELECT expires_at, data FROM results WHERE key = ? AND expires_at > ?',
+                               (key, time.time())).fetchone()
+        except sqlite3.Error as e:
+            app.logger.warning(f'Persistent cache read failed: {str(e)}')
+            return None
+    if row is None:
+        return None
+    
+    expires_at, blob = row
+    data = orjson.loads(blob)
+    _remember(key, data, expires_at, len(blob))
+    return data
 
-def clean_expired_cache():
-    """Remove expired cache entries"""
-    current_time = time.time()
-    expired_keys = [key for key, value in cache.items() 
-                    if current_time > value['expires_at']]
-    for key in expired_keys:
-        del cache[key]
+def store_cached_result(key, data):
+    """Store data in the in-memory and persistent caches"""
+    blob = dumps_json(data)
+    expires_at = time.time() + CACHE_TTL
+    _remember(key, data, expires_at, len(blob))
+    
+    with _cache_db_lock:
+        conn = _cache_db()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO results (key, expires_at, data) VALUES (?, ?, ?)',
+                             (key, expires_at, blob))
+                conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+                # Evict the oldest rows over budget, always keeping the newest one
+                conn.execute('DELETE FROM results WHERE key IN ('
+                             'SELECT key FROM (SELECT key, length(data) AS size, SUM(length(data)) OVER '
+                             '(ORDER BY expires_at DESC ROWS UNBOUNDED PRECEDING) AS total FROM results) '
+                             'WHERE total > ? AND total > size)', (MAX_CACHE_BYTES,))
+        except sqlite3.Error as e:
+            app.logger.warning(f'Persistent cache write failed: {str(e)}')
+
+def delete_cached_result(key):
+    """Remove an entry from cache. Returns True if it was present."""
+    global cache_bytes
+    with cache_lock:
+        entry = cache.pop(key, None)
+        if entry is not None:
+            cache_bytes -= entry['size']
+    
+    deleted = False
+    with _cache_db_lock:
+        conn = _cache_db()
+        if conn is not None:
+            try:
+                with conn:
+                    deleted = conn.execute('DELETE FROM results WHERE key = ?', (key,)).rowcount > 0
+            except sqlite3.Error as e:
+                app.logger.warning(f'Persistent cache delete failed: {str(e)}')
+    return entry is not None or deleted
+
+# Patterns and tables used on every request, built once
+_TAG_RE = re.compile(r'<[^>]+>')
+_ASCII_WHITESPACE = {code: None for code in range(128) if chr(code).isspace()}
 
 def sanitize_text(text):
     """Basic sanitization to remove potentially dangerous characters"""
     # Remove HTML-like tags
-    text = re.sub(r'<[^>]+>', '', text)
+    text = _TAG_RE.sub('', text)
     return text
 
+def count_non_whitespace(text):
+    """Count characters excluding whitespace, without building a stripped copy via regex"""
+    if text.isascii():
+        # str.translate has a fast path for ASCII-only strings
+        return len(text.translate(_ASCII_WHITESPACE))
+    # str.split() uses the same whitespace definition as \s
+    return sum(map(len, text.split()))
+
 def get_word_embedding(word):
-    pass
-    # """Get word embedding vector for a word"""
-    # if word2vec_model is None:
-    #     return None
-    
-    # try:
-    #     # Word2Vec models are case-sensitive, try lowercase first
-    #     if word.lower() in word2vec_model:
-    #         return word2vec_model[word.lower()].tolist()
-    #     elif word in word2vec_model:
-    #         return word2vec_model[word].tolist()
-    #     else:
-    #         return None
-    # except:
-    #     return None
-
-def process_text(text, include_embeddings=True):
-    """Process text using NLTK and calculate statistics with embeddings"""
+    """Get word embedding vector for a word, as a view into the model's vector matrix"""
+    word2vec_model = get_w2v()
+    if word2vec_model is None:
+        return None
+    
+    # Word2Vec models are case-sensitive, try lowercase first
+    vocab = word2vec_model.key_to_index
+    index = vocab.get(word.lower())
+    if index is None:
+        index = vocab.get(word)
+    if index is None:
+        return None
+    return word2vec_model.vectors[index]
+
+# Tokenization results keyed by the digest of the raw text, so the cache never
+# keeps the text itself alive. Bounded by an approximate byte budget.
+token_cache = OrderedDict()
+token_cache_bytes = 0
+token_cache_lock = threading.Lock()
+MAX_TOKEN_CACHE_BYTES = 64 * 1024 * 1024  # 64MB
+
+def _token_cache_get(digest):
+    """Return cached tokenization results for digest, or None"""
+    with token_cache_lock:
+        entry = token_cache.get(digest)
+        if entry is None:
+            return None
+        token_cache.move_to_end(digest)
+        return entry['data']
+
+def _token_cache_put(digest, data):
+    """Cache tokenization results, evicting least recently used entries over budget"""
+    global token_cache_bytes
+    sentences, word_freq, content_words = data
+    # Rough size: the sentence strings plus a fixed cost per distinct word
+    size = sum(map(len, sentences)) + 100 * len(word_freq)
+    with token_cache_lock:
+        if digest in token_cache:
+            token_cache_bytes -= token_cache.pop(digest)['size']
+        token_cache[digest] = {'data': data, 'size': size}
+        token_cache_bytes += size
+        while token_cache_bytes > MAX_TOKEN_CACHE_BYTES and len(token_cache) > 1:
+            _, evicted = token_cache.popitem(last=False)
+            token_cache_bytes -= evicted['size']
+
+def _tokenize_and_count(text, digest):
+    """Tokenize sentences and words and count word frequencies, cached by the digest of the raw text.
+    Results are shared between calls, so treat them as read-only."""
+    cached = _token_cache_get(digest)
+    if cached is not None:
+        return cached
+
+    # Use NLTK to tokenize sentences
+    sentences = SENT_TOKENIZER.tokenize(text)
+    
+    # Tokenize words per sentence of the lowercased text, as word_tokenize does
+    word_freq, content_words = _count_words(WORD_TOKENIZER.tokenize_sents(SENT_TOKENIZER.tokenize(text.lower())))
+
+    result = (sentences, word_freq, content_words)
+    _token_cache_put(digest, result)
+    return result
+
+def _tokenize_and_count_batch(texts, digests):
+    """Tokenize and count several texts, sharing the per-text cache and making one
+    tokenizer call per stage for the texts that are not cached"""
+    results = [_token_cache_get(digest) for digest in digests]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, _tokenize_batch([texts[i] for i in missing])):
+            results[i] = result
+            _token_cache_put(digests[i], result)
+    return results
+
+def _tokenize_batch(texts):
+    """Tokenize and count several texts, making one tokenizer call per stage for the whole batch"""
+    sentences_per_text = SENT_TOKENIZER.tokenize_sents(texts)
+    lowered_per_text = SENT_TOKENIZER.tokenize_sents([text.lower() for text in texts])
+    
+    # Tokenize the sentences of every text in one call, then split them back per text
+    tokens = WORD_TOKENIZER.tokenize_sents([sentence for lowered in lowered_per_text for sentence in lowered])
+    results = []
+    start = 0
+    for sentences, lowered in zip(sentences_per_text, lowered_per_text):
+        word_freq, content_words = _count_words(tokens[start:start + len(lowered)])
+        start += len(lowered)
+        results.append((sentences, word_freq, content_words))
+    return results
+
+def _count_words(tokenized_sentences):
+    """Count alphabetic words across tokenized sentences and find the content words"""
+    # Keep only alphabetic words and count them in a single pass
+    word_freq = Counter(word for tokens in tokenized_sentences for word in tokens if word.isalpha())
+    
+    # Filter out stopwords once per unique word rather than per occurrence
+    content_words = [word for word in word_freq if word not in STOP_WORDS]
+
+    return word_freq, content_words
+
+def _lookup_embeddings(words, vocab=None, matrix=None):
+    """Look up embeddings for unique words in one batched pass over the model's
+    vector matrix, or over an already gathered (vocab, matrix) pair.
+    Returns the (N, d) vectors and a word -> row mapping."""
+    if vocab is None:
+        word2vec_model = get_w2v()
+        if word2vec_model is None:
+            return None, {}
+        vocab, matrix = word2vec_model.key_to_index, word2vec_model.vectors
+
+    embedded_words = [word for word in words if word in vocab]
+    vectors = matrix[[vocab[word] for word in embedded_words]]
+    embedding_rows = {word: row for row, word in enumerate(embedded_words)}
+    return vectors, embedding_rows
+
+def quantize_embeddings(vectors):
+    """Quantize each row to int8 with its own scale, so row ~= q * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127 if len(vectors) else np.empty(0, dtype=vectors.dtype)
+    scales[scales == 0] = 1  # All-zero rows quantize to zeros
+    q = np.round(vectors / scales[:, None]).astype(np.int8)
+    return q, scales
+
+def _build_word_dictionary(word_freq, word_count, include_embeddings, vectors=None, embedding_rows=None, raw_embeddings=False):
+    """Build the word dictionary as parallel arrays with one entry per unique word.
+    Embeddings are sent int8-quantized unless raw_embeddings is set."""
+    words = list(word_freq)
+    counts = np.fromiter(word_freq.values(), dtype=np.int64, count=len(words))
+    word_dictionary = {
+        'words': words,
+        'count': counts,
+        'frequency': np.round(counts / word_count, 4) if word_count > 0 else np.zeros(len(words)),
+        'is_stopword': np.fromiter((word in STOP_WORDS for word in words), dtype=bool, count=len(words))
+    }
+    
+    if include_embeddings:
+        # Row of each word in the embeddings array, or -1 if it has no embedding
+        embedding_rows = embedding_rows or {}
+        word_dictionary['embedding_row'] = np.fromiter((embedding_rows.get(word, -1) for word in words),
+                                                       dtype=np.int64, count=len(words))
+        if vectors is not None:
+            word_dictionary['embedding_dim'] = vectors.shape[1]
+            if raw_embeddings:
+                word_dictionary['embeddings'] = np.ascontiguousarray(vectors)
+            else:
+                word_dictionary['embeddings_q8'], word_dictionary['scales'] = quantize_embeddings(vectors)
+
+    return word_dictionary
+
+# Below this many words, scipy's cdist is faster than the matrix product
+SMALL_NEIGHBOR_SEARCH = 8
+# Distances are computed for this many query words at a time, so memory grows
+# with NEIGHBOR_BLOCK_ROWS x N rather than N x N
+NEIGHBOR_BLOCK_ROWS = 1024
+
+def _neighbors(neighbor_words, E, n=10):
+    """Calculate nearest neighbrs to each (unique) word in the document, given
+    their embeddings as the rows of a contiguous float32 matrix E.
+    Squared L2 distances come from ||x - y||^2 = ||x||^2 + ||y||^2 - 2x.y,
+    so each block of rows is a single BLAS matrix product. Below
+    SMALL_NEIGHBOR_SEARCH words they are computed directly with cdist instead.
+    Both paths return float32 distances."""
+    if len(neighbor_words) < 2:
+        return {}  # No other words to be neighbors of
+    
+    N = len(neighbor_words)
+    m = min(n, N) - 1  # Neighbors per word, not counting itself
+    small = N < SMALL_NEIGHBOR_SEARCH
+    if not small:
+        sq = np.einsum('ij,ij->i', E, E)
+
+    words_neighbors = {}
+    for start in range(0, N, NEIGHBOR_BLOCK_ROWS):
+        stop = min(start + NEIGHBOR_BLOCK_ROWS, N)
+        if small:
+            # For a handful of words a direct distance loop beats the matrix product setup
+            D = cdist(E[start:stop], E, 'sqeuclidean').astype(np.float32)
+        else:
+            D = sq[start:stop, None] + sq[None, :] - 2 * (E[start:stop] @ E.T)
+            np.maximum(D, 0, out=D)  # Clamp rounding error below zero
+        # A word is never its own neighbor, even when a near-duplicate ties with it
+        D[np.arange(stop - start), np.arange(start, stop)] = np.inf
+
+        # Top m nearest neighbors: partition first, then sort only those m columns
+        I = np.argpartition(D, m - 1, axis=1)[:, :m]
+        D = np.take_along_axis(D, I, axis=1)
+        order = np.argsort(D, axis=1)
+        I = np.take_along_axis(I, order, axis=1)
+        D = np.take_along_axis(D, order, axis=1)
+
+        for i in range(stop - start):
+            words_neighbors[neighbor_words[start + i]] = [{
+                'word': neighbor_words[neighbor_idx],
+                'distance': float(distance)
+            } for neighbor_idx, distance in zip(I[i], D[i])]
+
+    return words_neighbors
+
+def process_text(text, include_embeddings=True, raw_embeddings=False, digest=None):
+    """Process text using NLTK and calculate statistics with embeddings.
+    Pass the text's digest if the caller has already computed it.
+    Returns the result and whether it is complete: False if embeddings were
+    requested but the Word2Vec model was unavailable, so it should not be cached."""
     # Sanitize input
     sanitized = sanitize_text(text)
     
-    # Use NLTK to tokenize sentences
-    sentences = sent_tokenize(sanitized)
+    # Tokenize and count (cached per text, independent of options)
+    sentences, word_freq, content_words = _tokenize_and_count(sanitized, digest or text_digest(text))
     
-    # Use NLTK to tokenize words
-    words = word_tokenize(sanitized.lower())
+    # Checked before analyzing; the model is never unloaded once available
+    complete = not include_embeddings or get_w2v() is not None
+    return _analyze(sanitized, sentences, word_freq, content_words, include_embeddings, raw_embeddings), complete
+
+def process_texts(texts, include_embeddings=True, raw_embeddings=False, digests=None):
+    """Process several texts, sharing tokenizer calls and the embedding lookup across the batch.
+    Pass the texts' digests if the caller has already computed them.
+    Returns the results and whether they are complete, as process_text does."""
+    if digests is None:
+        digests = [text_digest(text) for text in texts]
+    sanitized = [sanitize_text(text) for text in texts]
+    tokenized = _tokenize_and_count_batch(sanitized, digests)
     
-    # Filter to only alphabetic words
-    words = [word for word in words if word.isalpha()]
+    # Gather vectors for the combined vocabulary of the batch once; each text
+    # then selects its rows from this much smaller matrix
+    batch_vocab, batch_vectors = None, None
+    if include_embeddings:
+        vocabulary = dict.fromkeys(word for _, word_freq, _ in tokenized for word in word_freq)
+        batch_vectors, batch_vocab = _lookup_embeddings(vocabulary)
+        if batch_vectors is None:
+            batch_vocab = None
     
+    complete = not include_embeddings or batch_vectors is not None
+    return [_analyze(text, sentences, word_freq, content_words, include_embeddings, raw_embeddings,
+                     batch_vocab, batch_vectors)
+            for text, (sentences, word_freq, content_words) in zip(sanitized, tokenized)], complete
+
+def _analyze(sanitized, sentences, word_freq, content_words, include_embeddings, raw_embeddings,
+             vocab=None, matrix=None):
+    """Calculate statistics, word dictionary, embeddings and neighbors for tokenized text"""
     # Calculate statistics
-    word_count = len(words)
+    word_count = sum(word_freq.values())
     sentence_count = len(sentences)
     avg_words_per_sentence = round(word_count / sentence_count, 2) if sentence_count > 0 else 0
     
-    # Word frequency dictionary
-    word_freq = Counter(words)
-    
     # Character count (excluding spaces)
-    char_count = len(re.sub(r'\s', '', sanitized))
+    char_count = count_non_whitespace(sanitized)
     
     # Unique words
-    unique_word_count = len(set(words))
+    unique_word_count = len(word_freq)
     
     # Average word length
-    avg_word_length = round(sum(len(word) for word in words) / word_count, 2) if word_count > 0 else 0
+    avg_word_length = round(sum(len(word) * count for word, count in word_freq.items()) / word_count, 2) if word_count > 0 else 0
     
-    # Get stopwords for filtering
-    stop_words = set(stopwords.words('english'))
-    content_words = [word for word in words if word not in stop_words]
+    # Content word occurrences
+    content_word_count = sum(word_freq[word] for word in content_words)
     
-    # Top words with their counts
+    # Top words with their counts (STOP_WORDS is a set, so each check is O(1))
     top_words = [ {'word': word, 'count': count}
-                 for word, count in word_freq.most_common(100) if word in content_words]
+                 for word, count in word_freq.most_common(100) if word not in STOP_WORDS]
+
+    # Look up embeddings for every unique word at once
+    vectors, embedding_rows = None, {}
+    if include_embeddings:
+        vectors, embedding_rows = _lookup_embeddings(word_freq, vocab, matrix)
 
     # Build word dictionary with embeddings
-    word_dictionary = {}
-    words_neighbors = {}
-    for word, count in word_freq.items():
-        word_entry = {
-            'count': count,
-            'frequency': round(count / word_count, 4) if word_count > 0 else 0,
-            'is_stopword': word in stop_words
-        }
-        
-        if include_embeddings:
-            embedding = get_word_embedding(word)
-            if embedding is not None:
-                word_entry['embedding'] = embedding
-                word_entry['embedding_dim'] = len(embedding)
-            else:
-                word_entry['embedding'] = None
-                word_entry['embedding_available'] = False
-        
-        word_dictionary[word] = word_entry
+    word_dictionary = _build_word_dictionary(word_freq, word_count, include_embeddings, vectors, embedding_rows, raw_embeddings)
     
     # Calculate average embedding for the document (only from words with embeddings)
     document_embedding = None
-    if include_embeddings and word2vec_model is not None:
-        embeddings = []
-        words_list = []
-        for word in content_words:  # Use content words only
-            emb = get_word_embedding(word)
-            if emb is not None:
-                embeddings.append(emb)
-                words_list.append(word)
-        
-        if embeddings:
-            document_embedding = np.mean(embeddings, axis=0).tolist()
-    
-        # Calculate nearest neighbrs to each word in the document
-        print(np.array(embeddings).shape)
-        n = 10
-        index = faiss.IndexFlatL2(word2vec_model.vector_size)
-        index.add(np.array(embeddings).astype('float32'))
-        D, I = index.search(np.array(embeddings).astype('float32'), n)  # Top n nearest neighbors
-
-
-        for i, word in enumerate(words_list):
-            neighbors = []
-            for j in range(1, n):  # Skip the first one (itself)
-                neighbor_idx = I[i][j]
-                neighbor_word = words_list[neighbor_idx]
-                neighbors.append({
-                    'word': neighbor_word,
-                    'distance': float(D[i][j])
-                })
-            words_neighbors[word] = neighbors
-
+    words_neighbors = {}
+    if include_embeddings and vectors is not None:
+        words_list = [word for word in content_words if word in embedding_rows]  # Use content words only
+        # One contiguous float32 matrix shared by the mean and the neighbor search
+        embeddings = np.ascontiguousarray(vectors[[embedding_rows[word] for word in words_list]], dtype=np.float32)
+        
+        # Each unique word counts once per occurrence in the mean. This is one
+        # float32 matrix-vector product, kept as an array for orjson to emit
+        counts = np.array([word_freq[word] for word in words_list], dtype=np.float32)
+        embedded_count = int(counts.sum())
+        if len(words_list) > 0:
+            document_embedding = counts @ embeddings / embedded_count
+    
+        words_neighbors = _neighbors(words_list, embeddings)
 
     result = {
         'statistics': {
@@ -211,8 +669,8 @@ def process_text(text, include_embeddings=True):
             'character_count': char_count,
             'avg_words_per_sentence': avg_words_per_sentence,
             'avg_word_length': avg_word_length,
-            'content_word_count': len(content_words),
-            'stopword_count': word_count - len(content_words)
+            'content_word_count': content_word_count,
+            'stopword_count': word_count - content_word_count
         },
         'top_words': top_words,
         'sentences': sentences,
@@ -222,7 +680,7 @@ def process_text(text, include_embeddings=True):
     
     if document_embedding is not None:
         result['document_embedding'] = document_embedding
-        result['embedding_coverage'] = round(len([w for w in content_words if get_word_embedding(w) is not None]) / len(content_words), 2) if content_words else 0
+        result['embedding_coverage'] = round(embedded_count / content_word_count, 2) if content_word_count else 0
     
     return result
 
@@ -236,6 +694,7 @@ def home():
         'endpoints': {
             'health': '/health',
             'process_text': '/api/process (POST)',
+            'process_batch': '/api/process/batch (POST)',
             'process_file': '/api/process/file (POST)',
             'word_info': '/api/word/<word> (GET)',
             'similarity': '/api/similarity (POST)'
@@ -245,11 +704,11 @@ def home():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    clean_expired_cache()
     return jsonify({
         'status': 'ok',
         'cache_size': len(cache),
-        'word2vec_loaded': word2vec_model is not None,
+        'cache_bytes': cache_bytes,
+        'word2vec_loaded': _w2v is not None,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -276,25 +735,26 @@ def process_text_endpoint():
         
         options = data.get('options', {})
         include_embeddings = options.get('include_embeddings', True)
+        raw_embeddings = options.get('raw_embeddings', False)
         
         # Check cache
-        cache_key = generate_cache_key(text, options)
-        clean_expired_cache()
+        digest = text_digest(text)
+        cache_key = generate_cache_key(text, options, digest=digest)
+        cached = get_cached_result(cache_key)
         
-        if cache_key in cache and time.time() < cache[cache_key]['expires_at']:
+        if cached is not None:
             return jsonify({
-                **cache[cache_key]['data'],
+                **cached,
                 'cached': True
             })
         
         # Process text
-        result = process_text(text, include_embeddings=include_embeddings)
+        result, complete = run_in_pool(process_text, text, include_embeddings=include_embeddings,
+                                       raw_embeddings=raw_embeddings, digest=digest)
         
-        # Store in cache
-        cache[cache_key] = {
-            'data': result,
-            'expires_at': time.time() + CACHE_TTL
-        }
+        # Store in cache, unless embeddings are missing because the model is not loaded yet
+        if complete:
+            store_cached_result(cache_key, result)
         
         return jsonify({
             **result,
@@ -306,6 +766,69 @@ def process_text_endpoint():
         app.logger.error(f'Processing error: {str(e)}')
         return jsonify({'error': f'Failed to process text: {str(e)}'}), 500
 
+@app.route('/api/process/batch', methods=['POST'])
+@limiter.limit("10 per minute")
+def process_batch_endpoint():
+    """Process a list of texts from JSON body in one batch"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'texts' not in data:
+            return jsonify({'error': 'Texts are required'}), 400
+        
+        texts = data['texts']
+        
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({'error': 'Texts must be a list of strings'}), 400
+        
+        if len(texts) == 0 or any(len(text.strip()) == 0 for text in texts):
+            return jsonify({'error': 'Texts cannot be empty'}), 400
+        
+        if len(texts) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Too many texts. Maximum {MAX_BATCH_SIZE}'}), 400
+        
+        if sum(len(text) for text in texts) > 5 * 1024 * 1024:  # 5MB total text limit
+            return jsonify({'error': 'Texts too large. Maximum 5MB in total'}), 400
+        
+        options = data.get('options', {})
+        include_embeddings = options.get('include_embeddings', True)
+        raw_embeddings = options.get('raw_embeddings', False)
+        
+        # Check cache for each text
+        digests = [text_digest(text) for text in texts]
+        cache_keys = [generate_cache_key(text, options, digest=digest) for text, digest in zip(texts, digests)]
+        results = [get_cached_result(cache_key) for cache_key in cache_keys]
+        
+        # Process each distinct text that was not cached once, as one batch
+        missing_by_key = {}
+        for i, result in enumerate(results):
+            if result is None:
+                missing_by_key.setdefault(cache_keys[i], []).append(i)
+        if missing_by_key:
+            first = [indices[0] for indices in missing_by_key.values()]
+            processed, complete = run_in_pool(process_texts, [texts[i] for i in first],
+                                              include_embeddings=include_embeddings, raw_embeddings=raw_embeddings,
+                                              digests=[digests[i] for i in first])
+            for (cache_key, indices), result in zip(missing_by_key.items(), processed):
+                # Don't cache results missing embeddings because the model is not loaded yet
+                if complete:
+                    store_cached_result(cache_key, result)
+                for i in indices:
+                    results[i] = result
+        
+        missing = {i for indices in missing_by_key.values() for i in indices}
+        return jsonify({
+            'results': [{
+                **result,
+                'cached': i not in missing,
+                'cache_key': cache_key
+            } for i, (result, cache_key) in enumerate(zip(results, cache_keys))]
+        })
+    
+    except Exception as e:
+        app.logger.error(f'Batch processing error: {str(e)}')
+        return jsonify({'error': f'Failed to process texts: {str(e)}'}), 500
+
 @app.route('/api/process/file', methods=['POST'])
 @limiter.limit("20 per minute")
 def process_file_endpoint():
@@ -333,30 +856,30 @@ def process_file_endpoint():
         
         options = {}
         if 'options' in request.form:
-            import json
             options = json.loads(request.form['options'])
         
         include_embeddings = options.get('include_embeddings', True)
+        raw_embeddings = options.get('raw_embeddings', False)
         
         # Check cache
-        cache_key = generate_cache_key(text, options)
-        clean_expired_cache()
+        digest = text_digest(text)
+        cache_key = generate_cache_key(text, options, digest=digest)
+        cached = get_cached_result(cache_key)
         
-        if cache_key in cache and time.time() < cache[cache_key]['expires_at']:
+        if cached is not None:
             return jsonify({
-                **cache[cache_key]['data'],
+                **cached,
                 'cached': True,
                 'filename': secure_filename(file.filename)
             })
         
         # Process text
-        result = process_text(text, include_embeddings=include_embeddings)
+        result, complete = run_in_pool(process_text, text, include_embeddings=include_embeddings,
+                                       raw_embeddings=raw_embeddings, digest=digest)
         
-        # Store in cache
-        cache[cache_key] = {
-            'data': result,
-            'expires_at': time.time() + CACHE_TTL
-        }
+        # Store in cache, unless embeddings are missing because the model is not loaded yet
+        if complete:
+            store_cached_result(cache_key, result)
         
         return jsonify({
             **result,
@@ -384,7 +907,7 @@ def get_word_info(word):
     
     return jsonify({
         'word': word,
-        'embedding': embedding,
+        'embedding': embedding.tolist(),
         'embedding_dim': len(embedding),
         'embedding_available': True
     })
@@ -400,18 +923,24 @@ def word_similarity():
         if not word1 or not word2:
             return jsonify({'error': 'Both word1 and word2 are required'}), 400
         
-        # if word2vec_model is None:
-        #     return jsonify({'error': 'Word2Vec model not loaded'}), 503
+        if get_w2v() is None:
+            return jsonify({'error': 'Word2Vec model not loaded'}), 503
         
-        try:
-            similarity = word2vec_model.similarity(word1, word2)
-            return jsonify({
-                'word1': word1,
-                'word2': word2,
-                'similarity': float(similarity)
-            })
-        except KeyError as e:
-            return jsonify({'error': f'Word not in vocabulary: {str(e)}'}), 404
+        embedding1 = get_word_embedding(word1)
+        embedding2 = get_word_embedding(word2)
+        for word, embedding in ((word1, embedding1), (word2, embedding2)):
+            if embedding is None:
+                return jsonify({'error': f"Word not in vocabulary: '{word}'"}), 404
+        
+        # Cosine similarity, computed directly on the vector views.
+        # A zero vector has similarity 0, as in gensim's unitvec.
+        denom = np.linalg.norm(embedding1) * np.linalg.norm(embedding2)
+        similarity = np.dot(embedding1, embedding2) / denom if denom != 0 else 0.0
+        return jsonify({
+            'word1': word1,
+            'word2': word2,
+            'similarity': float(similarity)
+        })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -419,22 +948,17 @@ def word_similarity():
 @app.route('/api/cached/<cache_key>', methods=['GET'])
 def get_cached(cache_key):
     """Retrieve cached result by key"""
-    clean_expired_cache()
+    cached = get_cached_result(cache_key)
     
-    if cache_key not in cache:
+    if cached is None:
         return jsonify({'error': 'Cache entry not found or expired'}), 404
     
-    if time.time() >= cache[cache_key]['expires_at']:
-        del cache[cache_key]
-        return jsonify({'error': 'Cache entry expired'}), 404
-    
-    return jsonify(cache[cache_key]['data'])
+    return jsonify(cached)
 
 @app.route('/api/cached/<cache_key>', methods=['DELETE'])
 def delete_cached(cache_key):
     """Delete cached entry"""
-    if cache_key in cache:
-        del cache[cache_key]
+    if delete_cached_result(cache_key):
         return jsonify({'message': 'Cache entry deleted'})
     
     return jsonify({'error': 'Cache entry not found'}), 404
@@ -450,11 +974,11 @@ def ratelimit_handler(e):
 if __name__ == '__main__':
     print(f"Text Processing API starting on http://localhost:5000")
     print(f"Cache TTL: {CACHE_TTL / 60} minutes")
-    print(f"Word2Vec model: {'Loaded' if word2vec_model else 'Not loaded'}")
+    print(f"Word2Vec model: {WORD2VEC_MODEL_NAME} (loading in background)")
     app.run(debug=True, host='0.0.0.0', port=5000)
     # with open('../Chapter1.txt', 'r') as f:
     #     text = f.read()
-    # results = process_text(text)
+    # results, _ = process_text(text)
     # print("Sample processing results:")
     # import json
     # with open('results.json', 'w') as f:
@@ -107,6 +107,23 @@ def health_check():
     print(f"Timestamp: {result['timestamp']}")
     print()
 
+def process_batch():
+    """Example 7: Process several texts in one request"""
+    print("=== Example 7: Process Batch ===")
+    
+    response = requests.post(f'{API_BASE}/api/process/batch', json={
+        'texts': [
+            'The first text is short. It has two sentences.',
+            'The second text is even shorter.'
+        ]
+    })
+    
+    result = response.json()
+    print(f"Status: {response.status_code}")
+    for item in result['results']:
+        print(f"Word Count: {item['statistics']['word_count']}, Cached: {item['cached']}")
+    print()
+
 def run_all_examples():
     """Run all examples in sequence"""
     try:
@@ -119,6 +136,9 @@ def run_all_examples():
         # Process same text (cached)
         process_text_cached(cache_key1)
         
+        # Process several texts at once
+        process_batch()
+        
         # Upload file
         cache_key2 = upload_file()
         
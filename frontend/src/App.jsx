@@ -68,7 +68,26 @@ const TextAnalyzer = () => {
   const stats = useMemo(() => {
     if (!apiData || !processedText) return null;
 
-    const wordDict = apiData.word_dictionary || {};
+    // word_dictionary arrives as parallel arrays; index it by word for lookups
+    const dict = apiData.word_dictionary || {};
+    const wordDict = {};
+    (dict.words || []).forEach((w, i) => {
+      const row = dict.embedding_row ? dict.embedding_row[i] : -1;
+      let embedding = null;
+      if (row >= 0 && dict.embeddings_q8) {
+        // Embeddings arrive int8-quantized with a per-word scale; expand them back to floats
+        embedding = dict.embeddings_q8[row].map(v => v * dict.scales[row]);
+      } else if (row >= 0 && dict.embeddings) {
+        embedding = dict.embeddings[row];
+      }
+      wordDict[w] = {
+        count: dict.count[i],
+        frequency: dict.frequency[i],
+        is_stopword: dict.is_stopword[i],
+        embedding,
+        embedding_dim: dict.embedding_dim
+      };
+    });
     const apiStats = apiData.statistics || {};
 
     return {